@@ -1,11 +1,13 @@
 """Solve Wordle style word problems."""
 
 import datetime
+import os
 import string
 from argparse import ArgumentParser
-from collections import Counter
-from itertools import combinations_with_replacement, permutations
-from typing import Counter as CounterType, List
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from typing import Counter as CounterType, Dict, List, Optional, Tuple
 
 
 def generate_word_list_file(filename: str, words: List[str]) -> None:
@@ -18,48 +20,53 @@ def generate_word_list_file(filename: str, words: List[str]) -> None:
     :return: None
     """
     with open(filename, "w") as word_file:
-        for word in words:
-            word_file.write(word + "\n")
+        word_file.writelines(word + "\n" for word in words)
 
 
-def generate_word_list(word_size: int) -> List[str]:
+def generate_word_list(word_size: int, dictionary_file: str = "/usr/share/dict/words") -> List[str]:
     """Generated a list of words.
     
     Each word will be all lower case.
     
     :param word_size: Number of characters in each word
+    :param dictionary_file: Source of candidate words, one word per line; if the file doesn't
+                            exist, the NLTK "words" corpus is used instead
     :return: Sorted list of words
     """
     import enchant
     d = enchant.Dict("en_US")
 
-    char_set = string.ascii_lowercase
-
-    # Can't just use 'permutations' to generate the list because it
-    # won't include words with multiple instances of the same letter.
-    # So we have to use 'combinations_with_replacements' first to get
-    # every possible 'group' of letters. Then find all the permutations
-    # of each group. This will result in multiple instances of each word
-    # that has duplicate letters, so we'll use a 'set' to remove the
-    # duplicates.
+    # Only the words already in a word list can be valid, so walk that list once
+    # instead of building every possible combination of letters and checking each one.
+    if os.path.exists(dictionary_file):
+        with open(dictionary_file, "r") as dictionary:
+            candidates = dictionary.read().splitlines()
+    else:
+        import nltk
+        nltk.download("words", quiet=True)
+        from nltk.corpus import words as nltk_words
+        candidates = nltk_words.words()
+
+    # Use a 'set' since the list may contain the same word with different capitalization.
     words = set()
-    for c in combinations_with_replacement(char_set, word_size):
-        for p in permutations(c, word_size):
-            # Create a word from the group of letters
-            word = "".join(p)
-            # See if it is in the dictionary
-            if d.check(word):
-                # Exclude simple plurals by seeing if the same
-                # combination minus the final 's' is a word
-                if word.endswith("s"):
-                    if d.check(word[0:4]):
-                        continue
-                # This is a valid word, add it to the list
-                words.add(word)
+    for candidate in candidates:
+        word = candidate.strip().lower()
+        if len(word) != word_size or not word.isalpha() or not word.isascii():
+            continue
+        # See if it is in the dictionary
+        if d.check(word):
+            # Exclude simple plurals by seeing if the same
+            # combination minus the final 's' is a word
+            if word.endswith("s"):
+                if d.check(word[:-1]):
+                    continue
+            # This is a valid word, add it to the list
+            words.add(word)
     return sorted(words)
 
 
-def solve(target_word: str, word_list: List[str], show_work: bool = False) -> int:
+def solve(target_word: str, word_list: List[str], show_work: bool = False, first_guess: Optional[str] = None,
+          memo: Optional[Dict[tuple, Tuple[List[str], str]]] = None) -> int:
     """Solve the puzzle using the `word_list`.
 
     Use the following algorithm to try and solve the puzzle.
@@ -69,13 +76,28 @@ def solve(target_word: str, word_list: List[str], show_work: bool = False) -> in
     4) Reduce the word list based on the results of the guess.
     5) Repeat until the guess matches the `target_word`.
 
+    The algorithm is deterministic, so the reduced word list and the next guess only depend on
+    the patterns returned by the earlier guesses. When solving for several target words, pass
+    the same `memo` dictionary to each call to reuse that work between them.
+
     :param target_word: The word we are trying to guess
     :param word_list: List of possible words
     :param show_work: Print status messages
+    :param first_guess: The `best_guess` for the full `word_list`, if it is already known
+    :param memo: Cache of (word list, guess) keyed by the patterns seen so far; only share
+                 it between calls that use the same `word_list`
     :return: Number of guesses needed to solve the puzzle
+
+    >>> solve("crane", ["crane", "Slate", "stone"])
+    1
+    >>> solve("crane", ["can't", "crane"])
+    2
+    >>> solve("crane", ["crane", "cafés"])
+    1
     """
-    # Make a copy, so we can reduce the list in place
-    words = word_list.copy()
+    words = word_list
+    # The patterns returned so far; this identifies where we are in the search
+    history = ()
 
     if show_work:
         print(f"Target word = {target_word}")
@@ -83,31 +105,24 @@ def solve(target_word: str, word_list: List[str], show_work: bool = False) -> in
     # Loop until we find the answer (starting at 1 since the guess count will be '1' based
     max_loop_count = 100
     for i in range(1, max_loop_count):
-        # Which letters are most used in the remaining word list
-        counts = calculate_letter_distribution(words)
-        if show_work:
-            print(counts)
-
-        # Find the word in the list that consumes the highest "letter distribution"
-        word_scores = {}
-        for word in words:
-            score = 0
-            for letter in set(word):
-                score += counts[letter]
-            word_scores[word] = score
-
-        # Sort the dictionary
-        sorted_list = sorted(word_scores.items(), key=lambda x: x[1], reverse=True)
-        if show_work:
-            print(sorted_list)
+        if memo is not None and history in memo:
+            # Another target word has already been through here
+            words, guess = memo[history]
+        else:
+            if not history and first_guess is not None:
+                guess = first_guess
+            else:
+                guess = best_guess(words, show_work)
+            if memo is not None:
+                memo[history] = (words, guess)
 
-        guess = sorted_list[0][0]
         # Check the word; returns letters that were an exact match or were present somewhere else in the word
         exact_match, other_letters = evaluation_guess(guess, target_word)
 
         # Get letters that were in the guess but didn't match anywhere
         # Words with these letters will be removed from the word list
-        letters_to_remove = "".join(set(guess) - (set(exact_match) | set(other_letters)))
+        matched_mask = letter_mask((exact_match + other_letters).replace("*", ""))
+        letters_to_remove = mask_letters(letter_mask(guess) & ~matched_mask)
         if show_work:
             print(i, guess, exact_match, other_letters, letters_to_remove)
 
@@ -116,14 +131,12 @@ def solve(target_word: str, word_list: List[str], show_work: bool = False) -> in
                 print("Done")
             return i
 
-        # Remove the guess since it obviously wasn't the answer
-        words.remove(guess)
-
-        # Remove all other words that don't match the returned pattern
-        # Loop over a copy of the list, so we can modify the original list in the loop
-        for word in words.copy():
-            if not fits_pattern(word, exact_match, other_letters, letters_to_remove):
-                words.remove(word)
+        history += ((exact_match, other_letters),)
+        if memo is None or history not in memo:
+            # Keep only the words that match the returned pattern, dropping the guess
+            # since it obviously wasn't the answer
+            words = filter_words([word for word in words if word != guess],
+                                 exact_match, other_letters, letters_to_remove)
 
     # If we got here, we couldn't find a solution
     if show_work:
@@ -132,6 +145,52 @@ def solve(target_word: str, word_list: List[str], show_work: bool = False) -> in
     return max_loop_count
 
 
+def best_guess(words: List[str], show_work: bool = False) -> str:
+    """Pick the word that uses the most common letters in the word list.
+
+    :param words: List of possible words
+    :param show_work: Print status messages
+    :return: The word with the highest score
+    """
+    # Which letters are most used in the remaining word list
+    counts = calculate_letter_distribution(words)
+    if show_work:
+        print(counts)
+
+    # Find the word in the list that consumes the highest "letter distribution". A word's
+    # score is the sum of the counts for each letter in its letter mask. Rather than walking
+    # the bits of every word, build tables of the score for every combination of 7 letters,
+    # so each word only needs four lookups (a-z fit in the first four tables). Get the masks
+    # first, since that's what assigns bits to any new characters.
+    masks = [letter_mask(word) for word in words]
+    letter_counts = [counts[letter] for letter in MASK_LETTERS]
+    letter_counts += [0] * (-len(letter_counts) % 7)
+    tables = []
+    for first_bit in range(0, len(letter_counts), 7):
+        table = [0]
+        for letter_count in letter_counts[first_bit:first_bit + 7]:
+            # Every combination so far, then every combination so far plus this letter
+            table += [score + letter_count for score in table]
+        tables.append((first_bit, table))
+    (_, table_0), (_, table_7), (_, table_14), (_, table_21) = tables[:4]
+
+    word_scores = {}
+    for word, mask in zip(words, masks):
+        score = (table_0[mask & 127] + table_7[mask >> 7 & 127] +
+                 table_14[mask >> 14 & 127] + table_21[mask >> 21 & 127])
+        if mask >> 28:
+            # The word uses characters from outside a-z
+            score += sum(table[mask >> first_bit & 127] for first_bit, table in tables[4:])
+        word_scores[word] = score
+
+    if show_work:
+        print(sorted(word_scores.items(), key=lambda x: x[1], reverse=True))
+
+    # Only the top scoring word is needed, so there's no need to sort the whole dictionary.
+    # Ties go to the word that appears first in the list.
+    return max(word_scores, key=word_scores.get)
+
+
 def fits_pattern(word: str, exact_match: str, others: str, exclude: str) -> bool:
     """Evaluate the `word` and see if it matches the input patterns.
 
@@ -150,32 +209,54 @@ def fits_pattern(word: str, exact_match: str, others: str, exclude: str) -> bool
     >>> fits_pattern("abcde", "abc**", "*****", "d")
     False
     """
-    # Check for the presence of the excluded letters
-    if any([x in word for x in exclude]):
-        return False
-
-    remaining_letters = list(word)
-    for i, letter in enumerate(word):
-        if exact_match[i] != "*":
-            if letter != exact_match[i]:
-                return False
-            else:
-                # If the letter matches, remove it from the remaining_letters list
-                # so the others list won't find it in the next loop
-                remaining_letters.remove(letter)
-        if others[i] == word[i]:
-            # Letters in the "other" list can't be present in their current location,
-            # otherwise, they would have been in the exact_match list
-            return False
+    return len(filter_words([word], exact_match, others, exclude)) == 1
 
-    for i, letter in enumerate(others):
-        if letter != "*":
-            if letter not in remaining_letters:
-                return False
-            else:
-                remaining_letters.remove(letter)
 
-    return True
+def filter_words(words: List[str], exact_match: str, others: str, exclude: str) -> List[str]:
+    """Return the words that match the input patterns.
+
+    The patterns are broken down once up front, so this is much faster than calling
+    `fits_pattern` on each word.
+
+    :param words: Words to evaluate
+    :param exact_match: Letters that match the exact position
+    :param others: Letters that are present somewhere in the word
+    :param exclude: Letters that must not be in the word
+    :return: The words that satisfy the input patterns, in their original order
+
+    >>> filter_words(["abcde", "abdce", "abxce", "abdec"], "ab***", "**c**", "x")
+    ['abdce', 'abdec']
+    """
+    # Each "other" letter has to appear at least once more than it does in the exact matches.
+    # The letter masks below already check for one instance, so only repeated letters need counting.
+    required_counts = [(letter, others.count(letter) + exact_match.count(letter))
+                       for letter in set(others) - {"*"}]
+    required_counts = [(letter, count) for letter, count in required_counts if count > 1]
+
+    # Most words can be rejected by comparing letter masks before looking at any positions:
+    # the word has to use every matched letter and none of the excluded ones
+    required_mask = letter_mask((exact_match + others).replace("*", ""))
+    excluded_mask = letter_mask(exclude)
+    if required_mask & excluded_mask:
+        return []
+    checked_mask = required_mask | excluded_mask
+    candidates = [word for word in words if letter_mask(word) & checked_mask == required_mask]
+
+    # Check all the positions that have a pattern letter in a single pass over each word
+    position_checks = [(i, exact, other) for i, (exact, other) in enumerate(zip(exact_match, others))
+                       if exact != "*" or other != "*"]
+    matches = []
+    for word in candidates:
+        for i, exact, other in position_checks:
+            letter = word[i]
+            # Letters in the "other" list can't be present in their current location,
+            # otherwise, they would have been in the exact_match list
+            if letter == other or (exact != "*" and letter != exact):
+                break
+        else:
+            if all(word.count(letter) >= count for letter, count in required_counts):
+                matches.append(word)
+    return matches
 
 
 def evaluation_guess(guess: str, target_word: str) -> (str, str):
@@ -197,66 +278,149 @@ def evaluation_guess(guess: str, target_word: str) -> (str, str):
     >>> evaluation_guess("abcdd", "dfdff")
     ('*****', '***dd')
     """
-    # Look for letters that match exactly
-    exact_match = [a if a == b else "*" for a, b in zip(guess, target_word)]
-    # Make a list of all letters that didn't match exactly
-    remaining_letters = [b if a != b else "" for a, b in zip(guess, target_word)]
+    # Look for letters that match exactly, and count the target letters that didn't match exactly
+    exact_match = []
+    remaining_letters = {}
+    for a, b in zip(guess, target_word):
+        if a == b:
+            exact_match.append(a)
+        else:
+            exact_match.append("*")
+            remaining_letters[b] = remaining_letters.get(b, 0) + 1
 
     # Now see if any of those remaining letters are present somewhere else in the target word
     others = []
-    for i, letter in enumerate(exact_match):
-        if letter != "*":
-            # This position was an exact match, so don't include it in the "others" list
-            others.append("*")
+    for a, b in zip(guess, exact_match):
+        if b == "*" and remaining_letters.get(a, 0) > 0:
+            # The letter is in the target word somewhere, so add it to the "other" list and
+            # use up one instance of it
+            others.append(a)
+            remaining_letters[a] -= 1
         else:
-            # This position wasn't an exact match, so see if the letter in the guess is in
-            # the list of remaining letters
-            if guess[i] in remaining_letters:
-                # The letter is in the target word somewhere, so add it to the "other" list and
-                # remove it from the remaining letters list
-                others.append(guess[i])
-                remaining_letters.remove(guess[i])
-            else:
-                others.append("*")
+            # Either this position was an exact match or the letter isn't left anywhere else
+            others.append("*")
 
     return "".join(exact_match), "".join(others)
 
 
+# The letter for each bit of a letter mask. Any character outside a-z gets the next free bit
+# the first time it shows up in a word.
+MASK_LETTERS = list(string.ascii_lowercase)
+LETTER_BITS = {letter: bit for bit, letter in enumerate(MASK_LETTERS)}
+
+
+@lru_cache(maxsize=None)
+def letter_mask(word: str) -> int:
+    """Return a bit mask of the distinct letters in the word.
+
+    Bit 0 is set if the word contains an "a", bit 1 for "b", and so on. Any other characters
+    (upper case, accented, punctuation) are given bits after "z". The result is cached,
+    so each word is only broken down once no matter how many times it gets scored.
+
+    :param word: Word to evaluate
+    :return: Bit mask of the letters used in the word
+
+    >>> bin(letter_mask("abbey"))
+    '0b1000000000000000000010011'
+    >>> letter_mask("can't") == letter_mask("cant") | letter_mask("'")
+    True
+    >>> letter_mask("can't") == letter_mask("cant")
+    False
+    """
+    mask = 0
+    for letter in word:
+        bit = LETTER_BITS.get(letter)
+        if bit is None:
+            bit = LETTER_BITS[letter] = len(MASK_LETTERS)
+            MASK_LETTERS.append(letter)
+        mask |= 1 << bit
+    return mask
+
+
+def mask_letters(mask: int) -> str:
+    """Return the letters in a bit mask built by `letter_mask`.
+
+    :param mask: Bit mask of letters
+    :return: The letters in bit order (alphabetical for a-z)
+
+    >>> mask_letters(letter_mask("abbey"))
+    'abey'
+    >>> sorted(mask_letters(letter_mask("Cafés"))) == sorted(set("Cafés"))
+    True
+    """
+    letters = []
+    while mask:
+        # Pull off the lowest set bit
+        lowest_bit = mask & -mask
+        letters.append(MASK_LETTERS[lowest_bit.bit_length() - 1])
+        mask ^= lowest_bit
+    return "".join(letters)
+
+
 def calculate_letter_distribution(words: List[str]) -> CounterType:
     """Count the number of occurrences of each letter in the word list.
 
     :param words: List of words to evaluate
     :return: A counter object that contains an entry for each letter
     """
-    c = Counter()
-    for word in words:
-        c.update(word)
-    return c
+    return Counter("".join(words))
+
 
+def solve_words(target_words: List[str], word_list: List[str],
+                first_guess: Optional[str] = None) -> List[int]:
+    """Solve for each of the target words using the `word_list`.
 
-def analyze(word_list: List[str]) -> None:
+    The solutions share a memo, so the guesses they have in common are only worked out once.
+
+    :param target_words: The words we are trying to guess
+    :param word_list: List of possible words
+    :param first_guess: The `best_guess` for the full `word_list`, if it is already known
+    :return: Number of guesses needed to solve for each target word
+    """
+    memo = {}
+    return [solve(word, word_list, first_guess=first_guess, memo=memo) for word in target_words]
+
+
+def analyze(word_list: List[str], max_workers: Optional[int] = None) -> None:
     """Solve for every entry in the word list and summarize the results.
+
+    The word list is split into one block per process, and each process solves its block
+    of words with `solve_words`. Words are grouped by the pattern the first guess returns for
+    them, since those words go on to make the same guesses.
     
     :param word_list: List of words to solve for
+    :param max_workers: Number of processes to use (defaults to the number of CPUs)
     :return: None
     """
     print(f"Solving for {len(word_list)} words")
-    # The results will be stored in a list of lists; each list will contain all the
-    # words it took the same number of guesses to solve.
-    distribution = []
-    for i in range(100):
-        distribution.append([])
 
     # Process all the words and save the results
-    most_guesses = 0
+    max_workers = max_workers or os.cpu_count() or 1
+    # The first guess is the same for every word, so only work it out once
+    first_guess = best_guess(word_list) if word_list else None
+    # Words that get the same pattern back from the first guess share every step after it, so
+    # keep each of those groups within one block to get the most out of that process's memo.
+    # Hand out the biggest groups first to keep the blocks close to the same size.
+    first_patterns = {}
+    for word in word_list:
+        first_patterns.setdefault(evaluation_guess(first_guess, word), []).append(word)
+    blocks = [[] for _ in range(max_workers)]
+    for group in sorted(first_patterns.values(), key=len, reverse=True):
+        min(blocks, key=len).extend(group)
+    blocks = [block for block in blocks if block]
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        solve_block = partial(solve_words, word_list=word_list, first_guess=first_guess)
+        for block, block_results in zip(blocks, executor.map(solve_block, blocks)):
+            results.update(zip(block, block_results))
+    # Group the words by the number of guesses it took to solve them
+    distribution = defaultdict(list)
     for word in word_list:
-        guesses = solve(word, word_list)
-        if guesses > most_guesses:
-            most_guesses = guesses
-        distribution[guesses].append(word)
+        distribution[results[word]].append(word)
 
     # Display the results
-    for i in range(1, most_guesses):
+    for i in sorted(distribution):
         count = len(distribution[i])
         percent = (count / len(word_list)) * 100
         print(f"{i} - {count} ({percent:.2f}%) - {distribution[i]}")
@@ -270,11 +434,8 @@ def get_word_list_from_file(filename: str) -> List:
     :param filename: Name of the file containing the words
     :return: List of words
     """
-    words = []
     with open(filename, "r") as word_list_file:
-        for line in word_list_file.readlines():
-            words.append(line.strip())
-    return words
+        return [line.strip() for line in word_list_file]
 
 
 # noinspection PyShadowingNames
@@ -299,7 +460,7 @@ def solve_sub_command(args):
 # noinspection PyShadowingNames
 def analyze_sub_command(args):
     """Process the 'analyze' subcommand."""
-    analyze(get_word_list_from_file(args.word_list_file))
+    analyze(get_word_list_from_file(args.word_list_file), max_workers=args.jobs)
 
 
 if __name__ == "__main__":
@@ -319,6 +480,8 @@ if __name__ == "__main__":
     analyze_parser = subparsers.add_parser("analyze", help="Analyze solutions for all words")
     analyze_parser.add_argument("--word-list", dest="word_list_file", default=None,
                                 help="Use the specified list of words")
+    analyze_parser.add_argument("--jobs", type=int, default=None,
+                                help="Number of processes to use (defaults to the number of CPUs)")
     analyze_parser.set_defaults(func=analyze_sub_command)
 
     args = parser.parse_args()